@@ -0,0 +1,401 @@
+"""Command line interface of SmartDoor system including main sequence."""
+from __future__ import annotations
+
+import asyncio
+import os
+import shlex
+import shutil
+import signal
+import subprocess
+from functools import cache, partial
+from importlib.util import find_spec
+from logging import config as log_config
+from logging import getLogger
+from pathlib import Path
+from pprint import pformat
+from typing import TYPE_CHECKING
+
+import rich_click as click
+
+from . import __version__
+from .core.config import DEFAULT_CONFIG_PATH, USER_CONFIG_PATH, load_config
+
+if TYPE_CHECKING:
+    from nfc.tag import Tag
+
+    from .smartdoor import SmartDoor
+
+__all__ = ["cli"]
+
+logger = getLogger("main")
+
+
+@click.group(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.version_option(__version__, "-V", "--version")
+def cli():
+    """Smartdoor system CLI."""
+    pass
+
+
+@cli.command()
+@click.option(
+    "--locked/--unlocked", default=True, show_default=True, help="Set initial key status."
+)
+def start(locked: bool):
+    """Start SmartDoor system.
+
+    The infinite loop workflow is executed at foreground. The initial key status can be set by
+    `--locked` or `--unlocked` option, by default `--locked`.
+
+    If you want to stop this system, press Ctrl+C.
+    """
+    # Configure loggers only when the system runs, keeping loggers created at import time enabled
+    log_config.fileConfig(Path(__file__).parent / "logging.conf", disable_existing_loggers=False)
+
+    # Apply real-time scheduling before any thread is spawned so that all threads inherit it
+    scheduler = load_config().get("scheduler", {})
+    _set_scheduler(cpu=scheduler.get("cpu", -1), priority=scheduler.get("priority", 0))
+
+    # Instantiate SmartDoor, imported here to keep the other commands light
+    from .smartdoor import SmartDoor
+
+    logger.info("start smartdoor system")
+    door = SmartDoor()
+
+    # Set initial key status
+    door.locked = locked
+    logger.info("Set initial key status to %s", "locked" if locked else "unlocked")
+
+    # SmartDoor seaquence starts
+    try:
+        asyncio.run(_sequence(door))
+        logger.info("Smartdoor system stopped by user")
+
+    except KeyboardInterrupt:
+        logger.info("Smartdoor system stopped by user")
+
+    except Exception:
+        logger.exception("unexpected error occurred")
+        door.error_sequence()
+
+    finally:
+        door.close()
+
+
+def _set_scheduler(cpu: int, priority: int) -> None:
+    """Pin the current process to a CPU core and set SCHED_FIFO scheduling policy.
+
+    Each setting is skipped with a warning if it fails, e.g. due to the lack of permission.
+
+    Parameters
+    ----------
+    cpu
+        CPU core number the process is pinned to, negative to disable
+    priority
+        SCHED_FIFO priority, 0 to disable
+    """
+    if cpu >= 0:
+        try:
+            os.sched_setaffinity(0, {cpu})
+            logger.info("pinned to CPU %d", cpu)
+        except (AttributeError, OSError) as e:
+            logger.warning("cannot pin to CPU %d: %s", cpu, e)
+
+    if priority > 0:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+            logger.info("set SCHED_FIFO priority to %d", priority)
+        except (AttributeError, OSError) as e:
+            logger.warning("cannot set SCHED_FIFO priority: %s", e)
+
+
+async def _sequence(door: SmartDoor) -> None:
+    """Main sequence of SmartDoor system running in an event loop.
+
+    Blocking operations like NFC polling and door sequences are dispatched to the default executor so
+    that the event loop stays responsive to SIGINT, which stops the sequence gracefully.
+    """
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGINT, door.stop)
+
+    # Watch user-specific configuration file to invalidate authentication cache
+    config_mtime = USER_CONFIG_PATH.stat().st_mtime_ns if USER_CONFIG_PATH.exists() else 0
+
+    # Handlers for the result of `door.wait_for_touched`
+    async def on_button(_: None) -> None:
+        door.led_button.blink(on_time=0.2, off_time=0.2)
+        await loop.run_in_executor(None, partial(door.door_sequence, user="Button operator"))
+        door.led_button.on()
+
+    async def on_card(tag: Tag) -> None:
+        user = await loop.run_in_executor(None, door.authenticate, tag)
+
+        # If invalid user is detected
+        if user is None:
+            await loop.run_in_executor(None, door.warning_sequence)
+        else:
+            await loop.run_in_executor(None, partial(door.door_sequence, user=user))
+
+    while True:
+        tag = await loop.run_in_executor(None, door.wait_for_touched)
+
+        mtime = USER_CONFIG_PATH.stat().st_mtime_ns if USER_CONFIG_PATH.exists() else 0
+        if mtime != config_mtime:
+            config_mtime = mtime
+            door.invalidate_auth_cache()
+
+        # If tag == False (stopped)
+        if tag is False:
+            return
+
+        # If buttom is pushed (tag is None) or NFC card is detected
+        await (on_button if tag is None else on_card)(tag)
+
+
+@cli.command()
+@click.option("--debug", "-d", is_flag=True, help="show debug log")
+def logs(debug: bool):
+    """Show logs of SmartDoor system.
+
+    logs are stored in `~/smartdoor.log` or `~/smartdoor_debug.log`. If you want to show debug log,
+    use `--debug` option.
+    """
+    log = Path().home() / "smartdoor.log" if not debug else Path().home() / "smartdoor_debug.log"
+
+    if log.exists():
+        # Copy the log file to stdout in kernel space, falling back to buffered copy
+        stdout = click.get_binary_stream("stdout")
+        with log.open("rb") as file:
+            offset, size = 0, log.stat().st_size
+            try:
+                stdout.flush()
+                while offset < size:
+                    sent = os.sendfile(stdout.fileno(), file.fileno(), offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+            except (AttributeError, OSError):
+                file.seek(offset)
+                shutil.copyfileobj(file, stdout, 1 << 20)
+                stdout.flush()
+    else:
+        click.echo("log file not found.")
+
+
+@cli.command()
+@click.option("--show", is_flag=True, help="show current configuration parameters")
+@click.option(
+    "--generate", is_flag=True, help="generate default config file as ~/.config/smartdoor.toml"
+)
+def config(show: bool, generate: bool):
+    """Configuration tool for SmartDoor system.
+
+    If you want to configure smartdoor system, edit `~/.config/smartdoor.toml` directly, after
+    generating default config file by `--generate` option.
+    """
+    config = load_config()
+
+    # If config file not found and `--generate` option is specified, generate default config file
+    if generate and not USER_CONFIG_PATH.exists():
+        USER_CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with USER_CONFIG_PATH.open("w") as file:
+            file.write(DEFAULT_CONFIG_PATH.read_text())
+        click.echo(f"generated default config file as {USER_CONFIG_PATH}")
+
+    # Show configuation
+    elif show:
+        click.echo(pformat(config))
+    else:
+        click.echo(click.get_current_context().get_help())
+
+
+@cli.command()
+@click.option("--register", is_flag=True, help="register service to systemd")
+@click.option("--unregister", is_flag=True, help="unregister service from systemd")
+@click.option("--start", is_flag=True, help="start service")
+@click.option("--stop", is_flag=True, help="stop service")
+@click.option("--restart", is_flag=True, help="restart service")
+@click.option("--status", is_flag=True, help="show service status")
+def service(register: bool, unregister: bool, start: bool, stop: bool, restart: bool, status: bool):
+    """Systemd Service tool for SmartDoor system.
+
+    If you want to register/unregister smartdoor system to/from systemd, use `--register` or
+    `--unregister` option. If choosing `--register` option, smartdoor system will be ready for start
+    automatically.
+
+    You can also start/stop/restart service by `--start`, `--stop`, `--restart` option. If you want
+    to show service status, use `--status` option.
+
+    If `pigpio` is installed, launching `pigpio` daemon is also registered to systemd automatically.
+    """
+    messages: list[str] = []
+    errors: list[str] = []
+
+    if register:
+        # Register pigpio daemon to systemd
+        if _has_pigpio():
+            try:
+                service_file = Path(__file__).parent / "pigpio.service"
+                _systemctl(
+                    ["link", str(service_file)],
+                    ["daemon-reload"],
+                    ["enable", "pigpio.service"],
+                    output=messages,
+                    errors=errors,
+                )
+                messages.append("registered pigpio daemon to systemd")
+            except subprocess.CalledProcessError as e:
+                messages.append(str(e))
+                messages.append("failed to register pigpio daemon to systemd")
+
+        # Register smartdoor service to systemd
+        try:
+            service_file = Path(__file__).parent / "smartdoor.service"
+            _systemctl(
+                ["link", str(service_file)],
+                ["daemon-reload"],
+                ["enable", "smartdoor.service"],
+                output=messages,
+                errors=errors,
+            )
+            messages.append("registered service to systemd")
+        except subprocess.CalledProcessError as e:
+            messages.append(str(e))
+            messages.append("failed to register service to systemd")
+
+    elif unregister:
+        # Unregister smartdoor service from systemd
+        try:
+            _systemctl(
+                ["stop", "smartdoor.service"],
+                ["disable", "smartdoor.service"],
+                ["daemon-reload"],
+                output=messages,
+                errors=errors,
+            )
+            messages.append("unregistered service from systemd")
+        except subprocess.CalledProcessError as e:
+            messages.append(str(e))
+            messages.append("failed to unregister service from systemd")
+
+        # Unregister pigpio daemon from systemd
+        if _has_pigpio():
+            try:
+                _systemctl(
+                    ["stop", "pigpio.service"],
+                    ["disable", "pigpio.service"],
+                    ["daemon-reload"],
+                    output=messages,
+                    errors=errors,
+                )
+                messages.append("unregistered pigpio daemon from systemd")
+            except subprocess.CalledProcessError as e:
+                messages.append(str(e))
+                messages.append("failed to unregister pigpio daemon from systemd")
+
+    elif start:
+        # Start pigpio daemon
+        if _has_pigpio():
+            try:
+                _systemctl(["start", "pigpio.service"], output=messages, errors=errors)
+                messages.append("started pigpio daemon")
+            except subprocess.CalledProcessError as e:
+                messages.append(str(e))
+                messages.append("failed to start pigpio daemon")
+
+        # Start smartdoor service
+        try:
+            _systemctl(["start", "smartdoor.service"], output=messages, errors=errors)
+            messages.append("started service")
+        except subprocess.CalledProcessError as e:
+            messages.append(str(e))
+            messages.append("failed to start service")
+
+    elif stop:
+        # Stop smartdoor service
+        try:
+            _systemctl(["stop", "smartdoor.service"], output=messages, errors=errors)
+            messages.append("stopped service")
+        except subprocess.CalledProcessError as e:
+            messages.append(str(e))
+            messages.append("failed to stop service")
+
+        # Stop pigpio daemon
+        if _has_pigpio():
+            try:
+                _systemctl(["stop", "pigpio.service"], output=messages, errors=errors)
+                messages.append("stopped pigpio daemon")
+            except subprocess.CalledProcessError as e:
+                messages.append(str(e))
+                messages.append("failed to stop pigpio daemon")
+
+    elif restart:
+        try:
+            _systemctl(["restart", "smartdoor.service"], output=messages, errors=errors)
+            messages.append("restarted service")
+        except subprocess.CalledProcessError as e:
+            messages.append(str(e))
+            messages.append("failed to restart service")
+
+    elif status:
+        try:
+            _systemctl(
+                ["status", "--no-pager", "smartdoor.service"], output=messages, errors=errors
+            )
+        except subprocess.CalledProcessError as e:
+            messages.append(str(e))
+            messages.append("failed to show service status")
+
+    else:
+        click.echo(click.get_current_context().get_help())
+        return
+
+    # Echo all messages at once, keeping stderr of systemctl separated from stdout
+    if messages:
+        click.echo("\n".join(message.rstrip("\n") for message in messages))
+    if errors:
+        click.echo("\n".join(error.rstrip("\n") for error in errors), err=True)
+
+
+@cache
+def _has_pigpio() -> bool:
+    """Whether `pigpio` is importable, probed only once per process."""
+    return find_spec("pigpio") is not None
+
+
+def _systemctl(*commands: list[str], output: list[str], errors: list[str]) -> None:
+    """Run ``systemctl`` commands with a single ``sudo`` invocation.
+
+    Multiple commands are chained by ``&&`` in one shell, so the remaining commands are skipped once
+    one of them fails.
+
+    Parameters
+    ----------
+    *commands
+        arguments of each ``systemctl`` command, e.g. ``["enable", "smartdoor.service"]``
+    output
+        list where the captured stdout of the commands is appended
+    errors
+        list where the captured stderr of the commands is appended
+
+    Raises
+    ------
+    subprocess.CalledProcessError
+        if any of the commands fails
+    """
+    if len(commands) == 1:
+        args = ["sudo", "systemctl", *commands[0]]
+    else:
+        script = " && ".join(shlex.join(["systemctl", *command]) for command in commands)
+        args = ["sudo", "sh", "-c", script]
+
+    result = subprocess.run(args, capture_output=True, text=True)
+    if result.stdout:
+        output.append(result.stdout)
+    if result.stderr:
+        errors.append(result.stderr)
+    result.check_returncode()
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,5 +1,22 @@
 """Smartdoor core modules providing basic functions for smartdoor system."""
-from .authenticate import AuthIDm
-from .smartlock import SmartLock
+from __future__ import annotations
 
-__all__ = ["SmartLock", "AuthIDm"]
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+from .config import load_config
+
+if TYPE_CHECKING:
+    from .authenticate import AuthIDm
+    from .smartlock import SmartLock
+
+__all__ = ["SmartLock", "AuthIDm", "load_config"]
+
+# modules importing heavy dependencies (urllib3, gpiozero) are imported at the first access
+_LAZY_MODULES = {"AuthIDm": ".authenticate", "SmartLock": ".smartlock"}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_MODULES:
+        return getattr(import_module(_LAZY_MODULES[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,13 +1,53 @@
 """This module provides IDm authentication functions communicating with database through web api."""
 from __future__ import annotations
 
+import re
+import socket
 import sys
+from collections import OrderedDict
+from http.cookies import SimpleCookie
 from logging import getLogger
+from time import monotonic
 
-from requests import Request, Session
+from urllib3 import HTTPResponse, PoolManager, disable_warnings
+from urllib3.connection import HTTPConnection
+from urllib3.exceptions import InsecureRequestWarning
+from urllib3.util.retry import Retry
+
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+# set invisible of https secure warning
+disable_warnings(InsecureRequestWarning)
 
 module_logger = getLogger(__name__)
 
+# IDm accepted by authentication, which is inserted into the body template without escaping
+_IDM_PATTERN = re.compile(r"[0-9A-Fa-f]{16}")
+
+# JSON body template of authentication request: {"idm": "<idm>"}
+_BODY_PREFIX = b'{"idm": "'
+_BODY_SUFFIX = b'"}'
+
+
+class _StatusError(Exception):
+    """Raised when the database responds with other than 200 status code."""
+
+    def __init__(self, status: int) -> None:
+        super().__init__(f"unexpected status code: {status}")
+        self.status = status
+
+
+def _csrf_token(response: HTTPResponse) -> str | None:
+    """Extract CSRF token from `Set-Cookie` headers of the response."""
+    cookie: SimpleCookie = SimpleCookie()
+    for header in response.headers.getlist("Set-Cookie"):
+        cookie.load(header)
+    morsel = cookie.get("csrftoken")
+    return None if morsel is None else morsel.value
+
 
 class AuthIDm:
     """Authentication for IDm using web api.
@@ -22,40 +62,86 @@ class AuthIDm:
         session timeout to connect to the database, by default 10 sec
     """
 
+    __slots__ = (
+        "_pool",
+        "_url",
+        "_headers",
+        "_room",
+        "_allow_key",
+        "_cache",
+        "_reject_cache",
+    )
+
     logger = getLogger("main").getChild("AuthIDm")
 
+    # lifetime [sec] and maximum size of the approved IDm cache
+    CACHE_TTL = 300.0
+    CACHE_SIZE = 64
+
+    # lifetime [sec] of the rejected IDm cache
+    REJECT_TTL = 5.0
+
     def __init__(self, url: str, room: str, timeout: float = 10) -> None:
         try:
-            # get CSRF token in cookies
-            session = Session()
-            session.get(url, timeout=timeout, verify=False)
+            # reuse a single keep-alive connection, retrying on temporary server errors
+            pool = PoolManager(
+                num_pools=1,
+                maxsize=4,
+                cert_reqs="CERT_NONE",
+                # retry only connection failures and the gateway errors; a read timeout is not
+                # retried so that an unresponsive database costs a single timeout per touch
+                retries=Retry(
+                    total=2,
+                    read=0,
+                    backoff_factor=0.1,
+                    status_forcelist=[502, 503, 504],
+                    allowed_methods=frozenset(["GET", "HEAD", "POST"]),
+                    # return the last response so that its status is reported by authenticate
+                    raise_on_status=False,
+                ),
+                socket_options=HTTPConnection.default_socket_options
+                + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)],
+            )
 
-            # instantiate request object
+            # get CSRF token in cookies by HEAD request not to download the body
+            token = _csrf_token(pool.request("HEAD", url, timeout=timeout))
+            if token is None:
+                response = pool.request("GET", url, timeout=timeout, preload_content=False)
+                token = _csrf_token(response)
+                response.close()
+            if token is None:
+                raise KeyError("csrftoken")
+
+            # request headers, which are not changed in each authentication
             headers = {
-                "Content-type": "application/json",
-                "X-CSRFToken": session.cookies["csrftoken"],
+                "Content-Type": "application/json",
+                "X-CSRFToken": token,
+                "Cookie": f"csrftoken={token}",
             }
-            req = Request("POST", url, headers=headers)
 
         except Exception as e:
-            self.logger.error(f"cannot establish the connection to {url}")
-            self.logger.debug(f"{type(e)}: {e}")
+            self.logger.error("cannot establish the connection to %s", url)
+            self.logger.debug("%s: %s", type(e).__name__, e)
             sys.exit(1)
 
         # save variables as properties
-        self._session = session
-        self._request = req
+        self._pool = pool
+        self._url = url
+        self._headers = headers
         self._room = room
+        self._allow_key = f"allow_{room}"
+        self._cache: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._reject_cache: dict[str, float] = {}
 
     @property
-    def session(self) -> Session:
-        """Session object."""
-        return self._session
+    def pool(self) -> PoolManager:
+        """Connection pool manager."""
+        return self._pool
 
     @property
-    def request(self) -> Request:
-        """Request object."""
-        return self._request
+    def headers(self) -> dict[str, str]:
+        """Request headers including CSRF token."""
+        return self._headers
 
     @property
     def room(self) -> str:
@@ -68,6 +154,10 @@ class AuthIDm:
         If the given idm is validated, returns user name which is registered in database.
         Otherwise returns None.
 
+        Approved IDms are cached for :obj:`.CACHE_TTL` seconds in a LRU cache so that repeated
+        touches by the same card do not query the database again. Rejected IDms are also cached, but
+        only for :obj:`.REJECT_TTL` seconds not to lock out a newly registered user.
+
         Parameters
         ----------
         idm
@@ -80,31 +170,91 @@ class AuthIDm:
         str | None
             username which is registered in database, if not, retuning None.
         """
-        if not isinstance(idm, str):
+        # reject malformed idm without querying the database
+        if not isinstance(idm, str) or _IDM_PATTERN.fullmatch(idm) is None:
             self.logger.error("idm must be string containing 16 hexadecimal digits.")
             return None
 
-        self._request.json = {"idm": idm}
+        now = monotonic()
 
-        # request preparation
-        prepared_req = self.session.prepare_request(self._request)
-        try:
-            response = self._session.send(prepared_req, timeout=timeout, verify=False)
-            data = response.json()
+        # look up cached results
+        cached = self._cache.get(idm)
+        if cached is not None:
+            if cached[1] > now:
+                self._cache.move_to_end(idm)
+                self.logger.debug("cached user is found.")
+                return cached[0]
+            del self._cache[idm]
 
-            if data["auth"] == "valid":
-                if data[f"allow_{self._room}"]:
-                    return data["name"]
-            return None
+        expiry = self._reject_cache.get(idm)
+        if expiry is not None:
+            if expiry > now:
+                self.logger.debug("cached rejected idm is found.")
+                return None
+            del self._reject_cache[idm]
 
+        # failures are not cached so that the next touch retries the query
+        try:
+            name = self._query(idm, timeout)
+        except _StatusError as e:
+            self.logger.warning("auth endpoint returned %s", e.status)
+            return None
         except Exception as e:
-            self.logger.error(f"{type(e)}: {e}")
+            self.logger.error("%s: %s", type(e).__name__, e)
             return None
 
+        # cache the result, discarding the least recently used entry if the cache is full
+        if name is not None:
+            self._cache[idm] = (name, now + self.CACHE_TTL)
+            if len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+        else:
+            # drop expired entries so that a tap flood of random cards cannot grow the cache
+            for key, expiry in list(self._reject_cache.items()):
+                if expiry <= now:
+                    del self._reject_cache[key]
+            self._reject_cache[idm] = now + self.REJECT_TTL
+
+        return name
+
+    def clear_cache(self) -> None:
+        """Clear the cache of approved and rejected IDms."""
+        self._cache.clear()
+        self._reject_cache.clear()
+        self.logger.debug("authentication cache is cleared.")
+
+    def _query(self, idm: str, timeout: float) -> str | None:
+        """Query the database whether the given idm is approved.
+
+        The given idm must be validated as 16 hexadecimal digits in advance.
+
+        Raises
+        ------
+        _StatusError
+            if the database responds with other than 200 status code
+        """
+        # build the body, needing no JSON escape for hexadecimal digits
+        body = _BODY_PREFIX + idm.encode("ascii") + _BODY_SUFFIX
+
+        response = self._pool.urlopen(
+            "POST", self._url, body=body, headers=self._headers, timeout=timeout
+        )
+
+        # do not parse error pages
+        if response.status != 200:
+            raise _StatusError(response.status)
+
+        # decode raw bytes directly, using orjson if available
+        data = loads(response.data)
+
+        if data["auth"] == "valid" and data[self._allow_key]:
+            return data["name"]
+        return None
+
     def close(self):
-        """Close session."""
-        self.logger.debug("close session")
-        self._session.close()
+        """Close connections."""
+        self.logger.debug("close connections")
+        self._pool.clear()
 
 
 # for debug
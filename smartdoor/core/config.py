@@ -0,0 +1,87 @@
+"""This module provides configuration loading functions for smartdoor system."""
+from __future__ import annotations
+
+import pickle
+from copy import deepcopy
+from functools import lru_cache
+from logging import getLogger
+from pathlib import Path
+
+try:
+    import tomllib
+except ImportError:
+    import tomli as tomllib
+
+__all__ = ["load_config", "DEFAULT_CONFIG_PATH", "USER_CONFIG_PATH"]
+
+module_logger = getLogger(__name__)
+logger = getLogger("main").getChild("config")
+
+DEFAULT_CONFIG_PATH = Path(__file__).parent.parent / "default_config.toml"
+"""Path to the default configuration file."""
+
+USER_CONFIG_PATH = Path.home() / ".config" / "smartdoor.toml"
+"""Path to the user-specific configuration file."""
+
+CACHE_PATH = Path.home() / ".cache" / "smartdoor" / "config.pkl"
+"""Path to the cache file of the parsed configuration."""
+
+
+def load_config() -> dict:
+    """Load smartdoor configuration.
+
+    The default configuration file is loaded first, and then updated by the user-specific
+    configuration file (`~/.config/smartdoor.toml`) if exists.
+
+    The merged configuration is cached into `~/.cache/smartdoor/config.pkl` with the modification
+    times of both files, so the TOML files are parsed again only when either of them is modified.
+    Within a process, the loaded configuration is also kept in memory for the same modification
+    times, and a copy of it is returned.
+
+    Returns
+    -------
+    dict
+        configuration key-value map
+    """
+    user_exists = USER_CONFIG_PATH.exists()
+    key = (
+        DEFAULT_CONFIG_PATH.stat().st_mtime_ns,
+        USER_CONFIG_PATH.stat().st_mtime_ns if user_exists else 0,
+    )
+    return deepcopy(_load_config(key))
+
+
+@lru_cache(maxsize=4)
+def _load_config(key: tuple[int, int]) -> dict:
+    """Load configuration for the given modification times of the configuration files."""
+    # Load cached configuration if it is up to date
+    try:
+        with CACHE_PATH.open("rb") as file:
+            cached_key, config = pickle.load(file)
+        if cached_key == key:
+            logger.debug("Loaded cached configuration: %s", CACHE_PATH)
+            return config
+    except Exception:
+        pass
+
+    # Load default configuration file
+    with DEFAULT_CONFIG_PATH.open("rb") as file:
+        config = tomllib.load(file)
+
+    # Load user-specific configuration file if exists
+    if key[1]:
+        with USER_CONFIG_PATH.open("rb") as file:
+            config.update(tomllib.load(file))
+            logger.debug("Loaded user-specific configuration file: %s", USER_CONFIG_PATH)
+
+    # Save cache atomically
+    try:
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = CACHE_PATH.with_suffix(".tmp")
+        with tmp_path.open("wb") as file:
+            pickle.dump((key, config), file)
+        tmp_path.replace(CACHE_PATH)
+    except OSError as e:
+        logger.debug("cannot save configuration cache: %s", e)
+
+    return config
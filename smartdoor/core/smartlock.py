@@ -1,14 +1,99 @@
 """Module for SmartLock class."""
 from __future__ import annotations
 
+import os
 from logging import getLogger
-from time import sleep
+from pathlib import Path
+from queue import Queue
+from threading import Event, Thread
+from time import monotonic, sleep
 
 from gpiozero import LED, Button, Buzzer, Device, Servo
 
+try:
+    from gpiozero.pins.pigpio import PiGPIOFactory
+except ImportError:
+    PiGPIOFactory = None
+
 module_logger = getLogger(__name__)
 
 
+class _PwmGpio:
+    """Servomotor driven by the kernel PWM driver through ``/sys/class/pwm/``.
+
+    The 50 Hz pulse is generated in kernel space (e.g. by ``pwm-gpio`` driver enabled with
+    ``dtoverlay=pwm-gpio,gpio=12``), so it is free from the jitter of user-space PWM.
+    Only the part of :obj:`gpiozero.Servo` interface used by :obj:`SmartLock` is provided.
+
+    Parameters
+    ----------
+    chip
+        pwmchip number in ``/sys/class/pwm/``
+    channel
+        PWM channel number of the chip
+    min_pulse_width
+        pulse width [sec] at value -1
+    max_pulse_width
+        pulse width [sec] at value 1
+    """
+
+    # 50 Hz in nanoseconds
+    PERIOD = 20_000_000
+
+    def __init__(
+        self, chip: int, channel: int, min_pulse_width: float, max_pulse_width: float
+    ) -> None:
+        self._chip = Path(f"/sys/class/pwm/pwmchip{chip}")
+        self._channel = channel
+        self._path = self._chip / f"pwm{channel}"
+        self._min = round(min_pulse_width * 1e9)
+        self._span = round(max_pulse_width * 1e9) - self._min
+        self._value: float | None = None
+
+        if not self._path.exists():
+            (self._chip / "export").write_text(str(channel))
+
+        # attributes of exported channel may not be writable until udev sets their permission
+        deadline = monotonic() + 1.0
+        while True:
+            try:
+                self._write("period", self.PERIOD)
+                break
+            except (FileNotFoundError, PermissionError):
+                if monotonic() > deadline:
+                    raise
+                sleep(0.01)
+
+    @property
+    def value(self) -> float | None:
+        """Servomotor position between -1 and 1, or None when no signal is sent."""
+        return self._value
+
+    @value.setter
+    def value(self, value: float | None) -> None:
+        # skip sysfs writes when the position is not changed
+        if value == self._value:
+            return
+
+        if value is None:
+            if self._value is not None:
+                self._write("enable", 0)
+        else:
+            self._write("duty_cycle", self._min + round((value + 1) * self._span / 2))
+            if self._value is None:
+                self._write("enable", 1)
+        self._value = value
+
+    def close(self) -> None:
+        """Stop the pulse and unexport the PWM channel."""
+        if self._path.exists():
+            self._write("enable", 0)
+            (self._chip / "unexport").write_text(str(self._channel))
+
+    def _write(self, name: str, value: int) -> None:
+        (self._path / name).write_text(str(value))
+
+
 class SmartLock:
     """This class is used to control raspberry Pi's GPIO devices (LEDs, Buzzer, servomotor, etc.).
 
@@ -25,6 +110,14 @@ class SmartLock:
         - LED_button : output signal to button switch LED
         - buzzer : output signal to buzzer
         - servo : output signal to servomotor
+    pwm
+        ``(chip, channel)`` of the kernel PWM in ``/sys/class/pwm/`` driving the servomotor.
+        If None (default), the servomotor is driven by :obj:`gpiozero.Servo`.
+    servo_priority
+        SCHED_FIFO real-time priority (1-99) of the thread driving the servomotor.
+        The thread inherits the CPU affinity of the process, so isolating the core by
+        ``isolcpus=<cpu> nohz_full=<cpu> rcu_nocbs=<cpu>`` kernel parameters is recommended.
+        If 0 (default), the scheduling policy is inherited as well.
 
     Methods
     -------
@@ -34,49 +127,87 @@ class SmartLock:
     unlock()
         excute unlock seaquence
         (LED blinking -> buzzer beeping -> servomotor moving -> LED lighting)
+    wait_for_servo()
+        wait for the servomotor driven in background to finish
+    close()
+        stop the servomotor thread and release GPIO devices
     """
 
+    __slots__ = (
+        "_pins",
+        "_locked",
+        "_servo_queue",
+        "_servo_idle",
+        "_servo_thread",
+        "led_red",
+        "led_green",
+        "led_button",
+        "button",
+        "buzzer",
+        "servo",
+    )
+
     # define class logger
     logger = getLogger("main").getChild("SmartLock")
 
-    def __init__(self, pins: dict[str, int]) -> None:
-        # set pin factory
-        try:
-            from gpiozero.pins.pigpio import PiGPIOFactory
+    # keys required in pin assignment map
+    PIN_KEYS = frozenset({"button", "LED_red", "LED_green", "LED_button", "buzzer", "servo"})
+
+    # servomotor steps of (value, holding time [sec]); value None means no signal sent
+    LOCK_SERVO_STEPS = ((-1.0, 0.5), (0.0, 0.5), (None, 0.0))
+    UNLOCK_SERVO_STEPS = ((1.0, 0.5), (0.0, 0.5), (None, 0.0))
 
-            Device.pin_factory = PiGPIOFactory()
-            self.logger.debug("using pigpio pin factory")
+    def __init__(
+        self, pins: dict[str, int], pwm: tuple[int, int] | None = None, servo_priority: int = 0
+    ) -> None:
+        # set pin factory shared by all GPIO devices
+        factory = Device.pin_factory
+        if PiGPIOFactory is not None and not isinstance(factory, PiGPIOFactory):
+            try:
+                factory = Device.pin_factory = PiGPIOFactory()
+                self.logger.debug("using pigpio pin factory")
 
-        except Exception:
-            self.logger.debug("using defalut pin factory")
+            except Exception:
+                self.logger.debug("using defalut pin factory")
 
         # validate pin assignment
         self.pins = pins
 
         # Initialize GPIO devices
         # === LED ===
-        self.led_red = LED(pins["LED_red"])
-        self.led_green = LED(pins["LED_green"])
-        self.led_button = LED(pins["LED_button"])
+        self.led_red = LED(pins["LED_red"], pin_factory=factory)
+        self.led_green = LED(pins["LED_green"], pin_factory=factory)
+        self.led_button = LED(pins["LED_button"], pin_factory=factory)
         self.led_button.on()
 
         # === Push button switch ===
-        self.button = Button(pins["button"])
+        self.button = Button(pins["button"], pin_factory=factory, bounce_time=0.05)
 
         # === Buzzer ===
-        self.buzzer = Buzzer(pins["buzzer"])
+        self.buzzer = Buzzer(pins["buzzer"], pin_factory=factory)
 
         # === Servo ===
-        self.servo = Servo(
-            pins["servo"],
-            initial_value=None,
-            min_pulse_width=0.5e-3,
-            max_pulse_width=2.4e-3,
-        )
+        if pwm is not None:
+            self.servo = _PwmGpio(*pwm, min_pulse_width=0.5e-3, max_pulse_width=2.4e-3)
+        else:
+            self.servo = Servo(
+                pins["servo"],
+                pin_factory=factory,
+                initial_value=None,
+                min_pulse_width=0.5e-3,
+                max_pulse_width=2.4e-3,
+            )
 
         # initialize locked property to avoid unexpected behavior
         self._locked = False
 
+        # servomotor is driven by a dedicated worker consuming queued sequences
+        self._servo_queue: Queue = Queue()
+        self._servo_idle = Event()
+        self._servo_idle.set()
+        self._servo_thread = Thread(target=self._servo_worker, args=(servo_priority,), daemon=True)
+        self._servo_thread.start()
+
     @property
     def pins(self) -> dict[str, int]:
         """Pins asssignment map."""
@@ -87,6 +218,16 @@ class SmartLock:
         if not isinstance(maps, dict):
             raise TypeError("pins must be dict type.")
 
+        # validate required keys before any GPIO device is initialized
+        missing = self.PIN_KEYS - maps.keys()
+        if missing:
+            raise KeyError(f"missing pin assignment: {', '.join(sorted(missing))}")
+
+        # validate pin numbers in a single pass (bool is rejected though it is a subclass of int)
+        for key, pin in maps.items():
+            if type(pin) is not int:
+                raise TypeError(f"pin number of {key} must be int: {pin!r}")
+
         # validate pin assignment
         self._check_pin_overlap(maps)
         self._pins = maps
@@ -117,7 +258,7 @@ class SmartLock:
             self.led_red.off()
             self.led_green.on()
 
-    def lock(self) -> None:
+    def lock(self, background: bool = False) -> None:
         """Excute Locking sequence.
 
         The detail of the sequence is as follows:
@@ -127,32 +268,17 @@ class SmartLock:
         3. Buzzer beeping (2 times)
         4. Servomotor moving
         5. Red LED on
+
+        Parameters
+        ----------
+        background
+            If True, the servomotor is driven in a background thread and this method returns
+            immediately, by default False. :obj:`.locked` is updated before the motion starts.
         """
         self.logger.debug("locking sequence started")
+        self._key_sequence(self.led_red, self.led_green, 2, self.LOCK_SERVO_STEPS, True, background)
 
-        # Green LED off
-        self.led_green.off()
-
-        # Red LED blinking
-        self.led_red.blink(on_time=0.1, off_time=0.1)
-
-        # sound buzzer
-        self.buzzer.beep(on_time=0.1, off_time=0.05, n=2)
-
-        # control servomotor
-        self.servo.min()
-        sleep(0.5)
-        self.servo.mid()
-        sleep(0.5)
-        self.servo.detach()  # No signal sent
-
-        # Red LED on
-        self.led_red.on()
-
-        # set lock status
-        self.locked = True
-
-    def unlock(self) -> None:
+    def unlock(self, background: bool = False) -> None:
         """Excute unlocking sequence.
 
         The detail of the sequence is as follows:
@@ -162,36 +288,134 @@ class SmartLock:
         3. Buzzer beep (3 times)
         4. Servomotor moving
         5. Green LED on
+
+        Parameters
+        ----------
+        background
+            If True, the servomotor is driven in a background thread and this method returns
+            immediately, by default False. :obj:`.locked` is updated before the motion starts.
         """
         self.logger.debug("unlocking sequence started")
+        self._key_sequence(
+            self.led_green, self.led_red, 3, self.UNLOCK_SERVO_STEPS, False, background
+        )
 
-        # Red LED off
-        self.led_red.off()
+    def wait_for_servo(self, timeout: float | None = None) -> None:
+        """Wait for the servomotor driven in background to finish its motion.
 
-        # Green LED blinking
-        self.led_green.blink(on_time=0.1, off_time=0.1)
+        Parameters
+        ----------
+        timeout
+            timeout in seconds, by default None (wait forever)
+        """
+        self._servo_idle.wait(timeout)
 
-        # sound buzzer
-        self.buzzer.beep(on_time=0.1, off_time=0.05, n=3)
+    def close(self) -> None:
+        """Stop the thread driving the servomotor and release all GPIO devices.
 
-        # control servomotor
-        self.servo.max()
-        sleep(0.5)
-        self.servo.mid()
-        sleep(0.5)
-        self.servo.detach()  # No signal sent
+        The motion in progress is finished before stopping.
+        """
+        if self._servo_thread.is_alive():
+            self._servo_queue.put(None)
+            self._servo_thread.join()
+
+        for device in (
+            self.led_red,
+            self.led_green,
+            self.led_button,
+            self.button,
+            self.buzzer,
+            self.servo,
+        ):
+            device.close()
+
+    def _key_sequence(
+        self,
+        led_on: LED,
+        led_off: LED,
+        beeps: int,
+        servo_steps: tuple[tuple[float | None, float], ...],
+        locked: bool,
+        background: bool,
+    ) -> None:
+        """Common part of locking/unlocking sequence.
+
+        Parameters
+        ----------
+        led_on
+            LED blinking during the sequence
+        led_off
+            LED turned off at the beginning of the sequence
+        beeps
+            number of buzzer beeps
+        servo_steps
+            sequence of servomotor value and its holding time, e.g. :obj:`.LOCK_SERVO_STEPS`
+        locked
+            key's status after the sequence
+        background
+            whether the servomotor is driven in a background thread
+        """
+        # finish the previous motion before starting a new one
+        self.wait_for_servo()
 
-        # Green LED on
-        self.led_green.on()
+        led_off.off()
 
-        # set lock status
-        self.locked = False
+        # LED blinking
+        led_on.blink(on_time=0.1, off_time=0.1)
+
+        # sound buzzer
+        self.buzzer.beep(on_time=0.1, off_time=0.05, n=beeps)
+
+        # control servomotor
+        self._locked = locked
+        self._servo_idle.clear()
+        self._servo_queue.put((servo_steps, locked))
+        if not background:
+            self.wait_for_servo()
+
+    def _servo_worker(self, priority: int) -> None:
+        """Drive servomotor along the queued sequences in real-time priority."""
+        if priority > 0:
+            try:
+                os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+            except (AttributeError, OSError) as e:
+                self.logger.warning("failed to set servo thread priority: %s", e)
+
+        while True:
+            sequence = self._servo_queue.get()
+            # None is put by close() to stop the thread
+            if sequence is None:
+                break
+
+            servo_steps, locked = sequence
+            try:
+                self._drive_servo(servo_steps, locked)
+            except Exception:
+                self.logger.exception("failed to drive servomotor")
+            finally:
+                self._servo_idle.set()
+
+    def _drive_servo(self, servo_steps: tuple[tuple[float | None, float], ...], locked: bool):
+        """Drive servomotor along the given steps and set the key's status."""
+        servo = self.servo
+
+        # hold each step until its absolute deadline so that wakeup overruns do not accumulate
+        deadline = monotonic()
+        for value, duration in servo_steps:
+            servo.value = value
+            if duration:
+                deadline += duration
+                remaining = deadline - monotonic()
+                if remaining > 0:
+                    sleep(remaining)
+
+        # set lock status, which also turns the blinking LED on
+        self.locked = locked
 
     def _check_pin_overlap(self, maps: dict[str, int]):
         """Check if pin assignment is overlaped."""
-        # pin numbers
-        pin_numbers = [num for num in maps.values()]
-
-        for pin in pin_numbers:
-            if pin_numbers.count(pin) > 1:
-                raise Exception("detect overlaped pin assignment!")
+        seen: dict[int, str] = {}
+        for key, pin in maps.items():
+            if pin in seen:
+                raise ValueError(f"detect overlaped pin assignment: {pin} ({seen[pin]}, {key})")
+            seen[pin] = key
@@ -1,30 +1,43 @@
 """This module provides a main class of SmartDoor system."""
 from __future__ import annotations
 
-from binascii import hexlify
+import pickle
 from collections import deque
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from logging import getLogger
 from pathlib import Path
-from time import sleep
+from threading import Event, Lock
+from time import sleep, strftime
 
 import requests
 from nfc import ContactlessFrontend
 from nfc.tag import Tag
-from urllib3 import disable_warnings
-from urllib3.exceptions import InsecureRequestWarning
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .core import AuthIDm, SmartLock, load_config
 
 try:
-    import tomllib
+    from orjson import dumps
 except ImportError:
-    import tomli as tomllib
+    from json import dumps
 
-from .core import AuthIDm, SmartLock
+module_logger = getLogger(__name__)
 
-# set invisible of https secure warning
-disable_warnings(InsecureRequestWarning)
+# format of the date posted to IFTTT (e.g. "2021/06/21 12:00:00")
+_DATE_FORMAT = "%Y/%m/%d %H:%M:%S"
 
-module_logger = getLogger(__name__)
+# headers of IFTTT post whose body is serialized in advance
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+POST_QUEUE_PATH = Path.home() / ".cache" / "smartdoor" / "post_queue.pkl"
+"""Path to the file keeping IFTTT post values failed to be posted."""
+
+
+def _const_false(tag: Tag) -> bool:
+    """Return False from nfcpy's on-connect callback to return the tag without waiting release."""
+    return False
 
 
 class SmartDoor(SmartLock):
@@ -36,38 +49,96 @@ class SmartDoor(SmartLock):
     The user-specific configuration file (`~/.config/smartdoor.toml`) is loaded automatically.
     """
 
+    __slots__ = (
+        "_urls",
+        "_post_queue",
+        "_post_lock",
+        "_drain_lock",
+        "_drain_scheduled",
+        "_post_executor",
+        "_session",
+        "_auth",
+        "_clf",
+        "_rdwr_options",
+        "_stop_event",
+        "_room",
+        "_wakeup",
+    )
+
     # define class logger
     logger = getLogger("main").getChild("SmartDoor")
 
-    def __init__(self) -> None:
-        # Load default configuration file
-        with open(Path(__file__).parent / "default_config.toml", "rb") as file:
-            config = tomllib.load(file)
+    # maximum number of IFTTT post values kept for retry; the oldest ones are discarded
+    POST_QUEUE_SIZE = 256
 
-        # Load user-specific configuration file if exists
-        config_path = Path.home() / ".config" / "smartdoor.toml"
-        if config_path.exists():
-            with config_path.open("rb") as file:
-                config.update(tomllib.load(file))
-                self.logger.debug(f"Loaded user-specific configuration file: {config_path}")
+    def __init__(self) -> None:
+        # Load configuration
+        config = load_config()
 
         # === Initialization ==================================================
         # IFTTT
-        self._urls: dict[str, str] = {}
+        self._urls: dict[str, str]
         self.urls = config["IFTTT_URLs"]
-        self._post_queue: deque = deque()
+        self._post_queue: deque = self._load_post_queue()
+        self._post_lock = Lock()
+        self._drain_lock = Lock()
+        self._drain_scheduled = False
+        self._post_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ifttt")
+
+        # keep-alive HTTP session reused for every IFTTT post
+        self._session = requests.Session()
+        self._session.mount(
+            "https://",
+            HTTPAdapter(
+                pool_connections=8,
+                pool_maxsize=8,
+                # back off when IFTTT is rate limiting or unavailable. Retry-After is ignored so
+                # that the short backoff bounds the wait (and close()) instead of the server.
+                max_retries=Retry(
+                    total=2,
+                    backoff_factor=0.3,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset({"POST"}),
+                    respect_retry_after_header=False,
+                    # return the last response so that its status code is logged by _post_value
+                    raise_on_status=False,
+                ),
+            ),
+        )
 
         # IDm authentication class
         self._auth = AuthIDm(config["auth_url"], config["room"])
 
-        # NFC reader
-        self._clf = ContactlessFrontend("usb")
+        # NFC reader, opened at the first access
+        self._clf: ContactlessFrontend | None = None
+        self._rdwr_options = {
+            "targets": ["212F"],  # detect only Felica
+            "on-connect": _const_false,
+            # nfcpy checks terminate only after all iterations, so keep a cycle short (0.5 sec)
+            "iterations": 5,
+            "interval": 0.1,
+        }
+        self._stop_event = Event()
 
         # room name
         self._room = config["room"]
 
         # inheritance
-        super().__init__(config["pins"])
+        servo_pwm = config.get("servo_pwm", {})
+        chip = servo_pwm.get("chip", -1)
+        pwm = (chip, servo_pwm.get("channel", 0)) if chip >= 0 else None
+        servo_priority = config.get("scheduler", {}).get("servo_priority", 0)
+        super().__init__(config["pins"], pwm=pwm, servo_priority=servo_priority)
+
+        # Button push is notified by its edge interrupt instead of polling the pin state.
+        # The same event is set by stop(), so NFC polling checks only one flag to terminate.
+        self._wakeup = Event()
+        self.button.when_pressed = self._wakeup.set
+
+        # post values restored from the previous process without waiting for the next event
+        if self._post_queue:
+            self._drain_scheduled = True
+            self._post_executor.submit(self._drain_post_queue)
 
     @property
     def urls(self) -> dict[str, str]:
@@ -87,7 +158,9 @@ class SmartDoor(SmartLock):
                 raise TypeError(f"Invalid type of key: {type(key)}")
             if not isinstance(url, str):
                 raise TypeError(f"Invalid type of url: {type(url)}")
-            self._urls[key] = url
+
+        # replace the map so that removed events are not left behind
+        self._urls = dict(value)
 
     @property
     def post_queue(self) -> deque:
@@ -96,7 +169,12 @@ class SmartDoor(SmartLock):
 
     @property
     def clf(self) -> ContactlessFrontend:
-        """Nfcpy's Contactless Frontend class instance."""
+        """Nfcpy's Contactless Frontend class instance.
+
+        The USB reader is opened at the first access.
+        """
+        if self._clf is None:
+            self._clf = ContactlessFrontend("usb")
         return self._clf
 
     @property
@@ -107,27 +185,42 @@ class SmartDoor(SmartLock):
     def wait_for_touched(self) -> None | bool | Tag:
         """Wait for the NFC card to be touched.
 
+        The waiting is terminated when the button is pushed during the waiting, which is detected by
+        the edge interrupt of the button, or when :obj:`.stop` is called.
+
         Returns
         -------
         None | bool | obj:`nfc.tag.Tag`
             If the button is pushed, returns None.
-            If the KeyboadInterrupt is detected, returns False.
+            If the KeyboadInterrupt is detected or :obj:`.stop` is called, returns False.
             otherwise, returns the instance of nfcpy's Tag class.
         """
-        rdwr_options = {
-            "targets": ["212F"],  # detect only Felica
-            "on-connect": lambda tag: False,
-            "iterations": 5,
-            "interval": 0.5,
-        }
-        tag = self.clf.connect(rdwr=rdwr_options, terminate=lambda: self.button.is_pressed)
+        self._wakeup.clear()
+        if self._stop_event.is_set():
+            return False
+
+        tag = self.clf.connect(rdwr=self._rdwr_options, terminate=self._wakeup.is_set)
+
+        if self._stop_event.is_set():
+            return False
 
         return tag
 
+    def stop(self) -> None:
+        """Request to stop waiting for the NFC card.
+
+        This method is thread-safe, so it can be called from a signal handler while
+        :obj:`.wait_for_touched` is running in another thread.
+        """
+        self.logger.debug("stop requested")
+        self._stop_event.set()
+        self._wakeup.set()
+
     def authenticate(self, tag: Tag) -> str | None:
         """Authenticate the approved user.
 
         This method authenticates the user by the IDm of the NFC card.
+        Recently authenticated IDms are cached by :obj:`.AuthIDm.authenticate`.
 
         Parameters
         ----------
@@ -146,15 +239,19 @@ class SmartDoor(SmartLock):
             self.led_red.on()
 
         # extract idm
-        idm = hexlify(tag.idm).decode("utf-8")
+        idm = tag.idm.hex()
 
-        self.logger.debug(f"idm: {idm} is detected.")
+        self.logger.debug("idm: %s is detected.", idm)
 
         # authentication
         name = self._auth.authenticate(idm)
 
         return name
 
+    def invalidate_auth_cache(self) -> None:
+        """Clear the cache of authenticated users and rejected IDms."""
+        self._auth.clear_cache()
+
     def post_ifttt(self, user: str = "test", action: str = "LOCK") -> None:
         """Post the info to IFTTT.
 
@@ -163,6 +260,8 @@ class SmartDoor(SmartLock):
         The action means the smartdoor action like a "LOCK", "UNLOCK", etc.
 
         If the post is failed, the data is cached into a queue and try to post again.
+        The queue is also saved into `~/.cache/smartdoor/post_queue.pkl`, so that it is restored
+        after restarting the system.
 
         Parameters
         ----------
@@ -171,43 +270,131 @@ class SmartDoor(SmartLock):
         action
             smartdoor action like "LOCK", "UNLOCK", etc, by default "LOCK"
         """
-        # get current datetime
-        date_now = datetime.now()
-        date_str = date_now.strftime(r"%Y/%m/%d %H:%M:%S")
+        self._enqueue_post(user, action)
+        self._drain_post_queue()
 
-        # cache post values into a queue
-        values = {"value1": date_str, "value2": user, "value3": action}
-        self.post_queue.append(values)
+    def _post_ifttt_later(self, user: str, action: str) -> None:
+        """Queue the info and post it to IFTTT in the posting thread.
 
-        # post to IFTTT in 3 seconds connect timeout and 7.5 seconds read timeout
-        try:
-            while self.post_queue:
-                data = self.post_queue.popleft()
-
-                for event, url in self.urls.items():
-                    res = requests.post(url, json=data, timeout=(3.0, 7.5))
-
-                    if res.status_code == 200:
-                        self.logger.debug(f"IFTTT post is completed: {event}")
-                    else:
-                        self.logger.error(
-                            f"IFTTT post is failed (code: {res.status_code}): {event}"
-                        )
-                        self._post_queue.appendleft(data)
+        The info is saved before returning, and only one drain is scheduled at a time, so values
+        arriving while IFTTT is unreachable stay in the bounded queue.
+        """
+        self._enqueue_post(user, action)
+        with self._post_lock:
+            if not self._drain_scheduled:
+                self._drain_scheduled = True
+                self._post_executor.submit(self._drain_post_queue)
+
+    def _enqueue_post(self, user: str, action: str) -> None:
+        """Append the info to the queue and save it."""
+        values = {"value1": strftime(_DATE_FORMAT), "value2": user, "value3": action}
+        with self._post_lock:
+            self._post_queue.append(values)
+            self._save_post_queue()
+
+    def _drain_post_queue(self) -> None:
+        """Post the queued values to IFTTT from the oldest one until a post is failed.
+
+        The queue lock is not held during posting, so that values can be queued meanwhile.
+        """
+        with self._drain_lock:
+            with self._post_lock:
+                self._drain_scheduled = False
+
+            # Each value is posted to all URLs concurrently so that a slow URL does not delay others
+            urls = self._urls
+            completed = True
+            with ThreadPoolExecutor(max_workers=min(8, max(1, len(urls)))) as executor:
+                while True:
+                    with self._post_lock:
+                        if not self._post_queue:
+                            break
+                        data = self._post_queue[0]
+
+                    if not self._post_value(executor, urls, data):
+                        completed = False
                         break
 
-            self.logger.info("IFTTT post is completed.")
+                    # the value may have been discarded by the queue size limit meanwhile
+                    with self._post_lock:
+                        if self._post_queue and self._post_queue[0] is data:
+                            self._post_queue.popleft()
 
+            with self._post_lock:
+                self._save_post_queue()
+                remaining = len(self._post_queue)
+
+            if completed:
+                self.logger.info("IFTTT post is completed.")
+            else:
+                self.logger.warning("%d IFTTT post values are kept to retry.", remaining)
+
+    def _post_value(
+        self, executor: ThreadPoolExecutor, urls: dict[str, str], data: dict[str, str]
+    ) -> bool:
+        """Post a value to all IFTTT URLs and return whether all posts are completed."""
+        # serialize once for all URLs (orjson returns bytes, json returns ascii str)
+        body = dumps(data)
+
+        # post to IFTTT in 3 seconds connect timeout and 7.5 seconds read timeout
+        futures = {
+            event: executor.submit(
+                self._session.post, url, data=body, headers=_JSON_HEADERS, timeout=(3.0, 7.5)
+            )
+            for event, url in urls.items()
+        }
+        completed = True
+        for event, future in futures.items():
+            try:
+                res = future.result()
+            except Exception:
+                self.logger.exception("IFTTT post is failed: %s", event)
+                completed = False
+                continue
+
+            if res.status_code == 200:
+                self.logger.debug("IFTTT post is completed: %s", event)
+            else:
+                self.logger.error("IFTTT post is failed (code: %d): %s", res.status_code, event)
+                completed = False
+
+        return completed
+
+    def _load_post_queue(self) -> deque:
+        """Load IFTTT post values saved by the previous process if exist."""
+        try:
+            with POST_QUEUE_PATH.open("rb") as file:
+                values = pickle.load(file)
+            self.logger.info("%d IFTTT post values are restored.", len(values))
+        except FileNotFoundError:
+            values = []
         except Exception:
-            self.logger.exception("IFTTT post is failed.")
-            self._post_queue.appendleft(data)
+            self.logger.exception("failed to restore IFTTT post values.")
+            values = []
+        return deque(values, maxlen=self.POST_QUEUE_SIZE)
+
+    def _save_post_queue(self) -> None:
+        """Save IFTTT post values left in the queue atomically, or remove the file if empty."""
+        try:
+            if not self._post_queue:
+                POST_QUEUE_PATH.unlink(missing_ok=True)
+                return
+
+            POST_QUEUE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = POST_QUEUE_PATH.with_suffix(".tmp")
+            with tmp_path.open("wb") as file:
+                pickle.dump(list(self._post_queue), file)
+            tmp_path.replace(POST_QUEUE_PATH)
+        except OSError as e:
+            self.logger.warning("cannot save IFTTT post values: %s", e)
 
     def door_sequence(self, user: str = "test") -> None:
         """Door sequence.
 
         If the door is locked, :obj:`.unlock` method is excuted.
         Otherwise, :obj:`.lock` method is excuted.
-        After that, the info is posted to IFTTT by :obj:`.post_ifttt` method.
+        While the servomotor is moving in background, the info is posted to IFTTT by
+        :obj:`.post_ifttt` method in another thread, so the network does not delay the sequence.
 
         Parameters
         ----------
@@ -215,32 +402,35 @@ class SmartDoor(SmartLock):
             user name controlling the door, by default "test"
         """
         if self.locked:
-            self.unlock()
+            self.unlock(background=True)
             action = "UNLOCK"
-            self.logger.info(f"unlocked by {user}")
+            self.logger.info("unlocked by %s", user)
         else:
-            self.lock()
+            self.lock(background=True)
             action = "LOCK"
-            self.logger.info(f"locked by {user}")
+            self.logger.info("locked by %s", user)
 
         # post to IFTTT
-        self.post_ifttt(user=user, action=action)
+        self._post_ifttt_later(user, action)
 
         # pause for 1 sec to avoid multiple execution
         sleep(1)
+        self.wait_for_servo()
 
     def warning_sequence(self) -> None:
         """Warning sequence when an unauthorized user touched the reader."""
-        # Blink red LED and sound buzzer
+        # Blink red LED
         self.led_green.off()
         self.led_red.blink(on_time=0.1, off_time=0.1)
-        self.buzzer.beep(n=2, on_time=0.5, off_time=0.1)
 
         # log
         self.logger.info("unauthorized user touched the reader")
 
         # post to IFTTT
-        self.post_ifttt(user="unauthorized user", action="INVALID TOUCH")
+        self._post_ifttt_later("unauthorized user", "INVALID TOUCH")
+
+        # sound buzzer, keeping the LED blinking until it finishes
+        self.buzzer.beep(n=2, on_time=0.5, off_time=0.1, background=False)
 
         # restore LED
         if self.locked:
@@ -278,8 +468,15 @@ class SmartDoor(SmartLock):
     def close(self) -> None:
         """Close the smartdoor system."""
         try:
-            self.clf.close()  # close nfc contactlessfrontend instance
+            if self._clf is not None:
+                self._clf.close()  # close nfc contactlessfrontend instance
             self._auth.close()  # close authentication session
+            # finish the running IFTTT post; values not posted yet are kept in the saved queue
+            self._post_executor.shutdown(wait=True, cancel_futures=True)
+            with self._post_lock:
+                self._save_post_queue()
+            self._session.close()  # close IFTTT session
+            super().close()  # finish servomotor motion and release GPIO devices
             self.logger.info("smartdoor system is closed.")
         except Exception:
             self.logger.exception("failed to close smartdoor system.")